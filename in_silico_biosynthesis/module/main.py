@@ -23,34 +23,134 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import json
+import os
+from pathlib import Path
+import time
 
 from rdkit import RDLogger
-from rdkit.Chem import CanonSmiles, MolFromSequence, MolFromSmiles, MolToSmiles
+from rdkit.Chem import (
+    CanonSmiles,
+    Mol,
+    MolFromSequence,
+    MolFromSmiles,
+    MolToSmiles,
+    SanitizeMol,
+)
 from rdkit.Chem.rdChemReactions import ReactionFromSmarts
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 RDLogger.DisableLog("rdApp.*")
 
-def apply_reaction(substrate: str, reaction: str) -> str:
+cache_dir = Path.home().joinpath(".cache/mite_ms")
+cache_max_age = 7 * 24 * 60 * 60  # seconds
+
+session = requests.Session()
+session.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=10,
+        pool_maxsize=10,
+        max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[502, 503, 504]),
+    ),
+)
+
+def _reorder_smarts(smarts: str) -> str:
+    """Orders the disconnected fragments of a grouped reactant template longest-first
+
+    Small fragments placed before large ones make the substructure search explode.
+    Only fragments inside a single component-level group '(A.B)' are reordered, since
+    separate reactant templates are matched by position in RunReactants.
+
+    Args:
+        smarts: a reaction SMARTS string
+
+    Returns:
+        The reaction SMARTS with reordered reactant fragments
+    """
+    lhs, sep, rest = smarts.partition(">")
+    if not (lhs.startswith("(") and lhs.endswith(")")):
+        return smarts
+
+    fragments = []
+    depth = 0
+    start = 1
+    for pos, char in enumerate(lhs[1:-1], start=1):
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+            if depth < 0:
+                return smarts
+        elif char == "." and depth == 0:
+            fragments.append(lhs[start:pos])
+            start = pos + 1
+    fragments.append(lhs[start:-1])
+
+    lhs = f"({'.'.join(sorted(fragments, key=len, reverse=True))})"
+    return f"{lhs}{sep}{rest}"
+
+
+@functools.lru_cache(maxsize=None)
+def _compile_reaction(smarts: str):
+    """Parses a reaction SMARTS once and reuses the compiled reaction"""
+    return ReactionFromSmarts(_reorder_smarts(smarts))
+
+
+@functools.lru_cache(maxsize=None)
+def _compile_mol(smiles: str):
+    """Parses a SMILES once and reuses the molecule"""
+    return MolFromSmiles(smiles)
+
+
+def apply_reaction(substrate: Mol, reaction: str) -> Mol:
+    """Applies reaction SMARTS to substrate and returns the product molecule
+
+    Args:
+        substrate: an RDKit molecule
+        reaction: a reaction SMARTS string
+
+    Raises:
+        StopIteration: the reaction did not yield any product
+
+    Returns:
+        The sanitized product molecule
+    """
+    rd_reaction = _compile_reaction(reaction)
+    products = rd_reaction.RunReactants([substrate], maxProducts=1)
+    if not products:
+        raise StopIteration
+
+    product = products[0][0]
+    SanitizeMol(product)
+    return product
+
+
+def apply_reaction_smiles(substrate: str, reaction: str) -> str:
     """Applies reaction SMARTS to substrate and returns the product smiles
 
     Args:
         substrate: a SMILES string
         reaction: a reaction SMARTS string
 
+    Raises:
+        StopIteration: the reaction did not yield any product
+
     Returns:
         The product SMILES string
     """
-    rd_substrate = MolFromSmiles(substrate)
-    rd_reaction = ReactionFromSmarts(reaction)
-    products = rd_reaction.RunReactants([rd_substrate])
-    products = (MolToSmiles(product[0]) for product in products)
-
-    return next(iter(products))
+    return MolToSmiles(apply_reaction(_compile_mol(substrate), reaction))
 
+@functools.lru_cache(maxsize=None)
 def mite_api_call(accession: str) -> str:
     """Retrieve json data from MITE API
 
+    Responses are cached in cache_dir and reused until older than cache_max_age
+
     Attributes:
         accession: a MITE accession ID
 
@@ -60,11 +160,22 @@ def mite_api_call(accession: str) -> str:
     Returns:
         the reaction SMARTS of the first reaction entry
     """
-    response = requests.get(f"https://mite.bioinformatics.nl/api/v1/mite/{accession}", timeout=10)
+    cache_path = cache_dir.joinpath(f"{accession}.json")
+    if cache_path.exists() and time.time() - cache_path.stat().st_mtime < cache_max_age:
+        mite_data = json.loads(cache_path.read_text())
+        return mite_data["reactions"][0]["reactionSMARTS"]
+
+    response = session.get(f"https://mite.bioinformatics.nl/api/v1/mite/{accession}", timeout=10)
     if response.status_code != 200:
         raise RuntimeError(f"Error in MITE API call: {response.status_code}")
 
     mite_data = response.json()
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(mite_data))
+    os.replace(tmp_path, cache_path)
+
     return mite_data["reactions"][0]["reactionSMARTS"]
 
 
@@ -84,23 +195,27 @@ def main() -> None:
         "MITE0000045": {"enzyme": "BotOMT"},
     }
 
-    for key in synthesis.keys():
-        synthesis[key]["r_smarts"] = mite_api_call(accession=key)
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        for key, r_smarts in zip(synthesis, executor.map(mite_api_call, synthesis)):
+            synthesis[key]["r_smarts"] = r_smarts
+
+    for value in synthesis.values():
+        _compile_reaction(value["r_smarts"])
 
-    products = [MolToSmiles(MolFromSequence("MGPVVVFDCMTADFLNDDPNNAELSALEMEELESWGAWDGEATS"))] # bottromycin A2 precursor from Streptomyces sp. BC16019 (MIBiG BGC0000469)
+    mols = [MolFromSequence("MGPVVVFDCMTADFLNDDPNNAELSALEMEELESWGAWDGEATS")] # bottromycin A2 precursor from Streptomyces sp. BC16019 (MIBiG BGC0000469)
 
     for key, value in synthesis.items():
         print(f"### Applying reaction {key}")
         try:
-            product = apply_reaction(substrate=products[-1], reaction=value["r_smarts"])
-            products.append(product)
-            print(f"###### Resulting product: {product}")
+            product = apply_reaction(substrate=mols[-1], reaction=value["r_smarts"])
+            mols.append(product)
+            print(f"###### Resulting product: {MolToSmiles(product)}")
         except StopIteration:
             print("### The last reaction SMARTS failed to yield any product.")
-            print(f"### The most recent product is: {products[-1]}")
+            print(f"### The most recent product is: {MolToSmiles(mols[-1])}")
             exit(1)
 
-    gen_bottromycin_a2 = CanonSmiles(products[-1])
+    gen_bottromycin_a2 = CanonSmiles(MolToSmiles(mols[-1]))
     real_bottromycin_a2 = CanonSmiles(
         "C[C@H]1[C@H]2C(N[C@@H](C(C)C)C(N[C@@H](C(C)(C)C)/C(=N/[C@@H](C(C)(C)C)C(N[C@H](C(N[C@@H](c3sccn3)CC(OC)=O)=O)[C@H](c3ccccc3)C)=O)/NCC(=O)N2CC1)=O)=O"
     )  # as described by doi:10.1039/D0NP00097C
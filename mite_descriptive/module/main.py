@@ -23,20 +23,20 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
-import json
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
 import logging
 import os
-import re
 from pathlib import Path
 import shutil
 import sys
+import zipfile
 
 import argparse
 import matplotlib.pyplot as plt
+import orjson
 import pandas as pd
-from pydantic import BaseModel
 import requests
-import seaborn as sns
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -44,7 +44,8 @@ console_handler = logging.StreamHandler()
 logger.addHandler(console_handler)
 
 
-class AbstractManager(BaseModel):
+@dataclass(slots=True, kw_only=True)
+class AbstractManager:
     """Class to contain general attributes
 
     data: path to mite_data json files
@@ -57,21 +58,20 @@ class AbstractManager(BaseModel):
     output: Path = Path(__file__).parent.joinpath("output")
 
 
+@dataclass(slots=True, kw_only=True)
 class DownloadManager(AbstractManager):
     """Download files from Zenodo record and unpack
 
     Attributes:
         record: the record to download
         location: the location to download data to
-        record: path to the record file
-        record_unzip: path to unzipped record file
+        record_zip: path to the downloaded record zip file
         version: path to file containing the version of mite_data used
     """
 
     record: str
     location: Path = Path(__file__).parent.joinpath("data")
-    record: Path = Path(__file__).parent.joinpath("data/record.zip")
-    record_unzip: Path = Path(__file__).parent.joinpath("data/record")
+    record_zip: Path = Path(__file__).parent.joinpath("data/record.zip")
     version: Path = Path(__file__).parent.joinpath("version.json")
 
     def run(self) -> None:
@@ -102,225 +102,372 @@ class DownloadManager(AbstractManager):
             )
             raise RuntimeError
 
-        record_metadata = response_metadata.json()
+        record_metadata = orjson.loads(response_metadata.content)
         version = record_metadata["metadata"]["version"]
         files_url = record_metadata["files"][0]["links"]["self"]
 
-        response_data = requests.get(files_url)
-        if response_data.status_code != 200:
-            logger.fatal(
-                f"Error downloading 'mite_data' record: {response_data.status_code}"
+        with open(self.version, "w") as f:
+            f.write(orjson.dumps({"version_mite_data_used": f"{version}"}).decode())
+
+        self.download_record(files_url)
+
+    def download_record(self, files_url: str, n_parts: int = 8) -> None:
+        """Download the record file with parallel HTTP range requests
+
+        Falls back to a single stream if the server does not support range requests
+
+        Arguments:
+            files_url: the URL of the record file
+            n_parts: the number of parallel range requests
+        """
+        response_head = requests.head(files_url, allow_redirects=True, timeout=60)
+        size = int(response_head.headers.get("Content-Length", 0))
+        if response_head.headers.get("Accept-Ranges") != "bytes" or size == 0:
+            self.download_stream(files_url)
+            return
+
+        with open(self.record_zip, "wb") as f:
+            f.truncate(size)
+
+        part_size = -(-size // n_parts)
+        starts = list(range(0, size, part_size))
+        ends = [min(start + part_size, size) - 1 for start in starts]
+
+        with ThreadPoolExecutor(max_workers=n_parts) as executor:
+            ranged = all(
+                executor.map(self.download_range, [files_url] * len(starts), starts, ends)
             )
-            raise RuntimeError
 
-        with open(self.version, "w") as f:
-            f.write(json.dumps({"version_mite_data_used": f"{version}"}))
+        if not ranged:
+            logger.warning("Server ignored range requests - download as single stream")
+            self.download_stream(files_url)
 
-        with open(self.record, "wb") as f:
-            f.write(response_data.content)
+    def download_range(self, files_url: str, start: int, end: int) -> bool:
+        """Download a byte range of the record file into its position in the file
 
-    def organize_data(self) -> None:
-        """Unpacks data, moves to convenient location, cleans up
+        Arguments:
+            files_url: the URL of the record file
+            start: the first byte of the range
+            end: the last byte of the range (inclusive)
 
         Raises:
-            NotADirectoryError: directory not unzipped in expected location
-            RuntimeError: Could not determine data location in downloaded folder
-        """
-        shutil.unpack_archive(
-            filename=self.record, extract_dir=self.record_unzip, format="zip"
-        )
-        if not self.record_unzip.exists():
-            logger.fatal(f"Could not find the unzipped directory {self.record_unzip}.")
-            raise NotADirectoryError
+            RuntimeError: Could not download files or the range did not match
 
-        matching_dirs = list(self.record_unzip.glob("mite-standard-mite_data-*"))
-        if not matching_dirs:
+        Returns:
+            False if the server answered with the full file instead of the range
+        """
+        with requests.get(
+            files_url,
+            headers={"Range": f"bytes={start}-{end}"},
+            stream=True,
+            timeout=60,
+        ) as response_data:
+            if response_data.status_code == 200:
+                return False
+            if response_data.status_code != 206:
+                logger.fatal(
+                    f"Error downloading 'mite_data' record: {response_data.status_code}"
+                )
+                raise RuntimeError
+
+            content_range = response_data.headers.get("Content-Range", "")
+            if not content_range.startswith(f"bytes {start}-{end}/"):
+                logger.fatal(
+                    f"Error downloading 'mite_data' record: requested bytes {start}-{end}, got '{content_range}'"
+                )
+                raise RuntimeError
+
+            response_data.raw.decode_content = True
+            with open(self.record_zip, "r+b") as f:
+                f.seek(start)
+                shutil.copyfileobj(response_data.raw, f, length=1024 * 1024)
+                written = f.tell() - start
+
+        if written != end - start + 1:
             logger.fatal(
-                "Could not determine data storage location in downloaded directory."
+                f"Error downloading 'mite_data' record: expected {end - start + 1} bytes from offset {start}, got {written}"
             )
             raise RuntimeError
 
-        subdir = matching_dirs[0]
+        return True
 
-        shutil.move(
-            src=self.record_unzip.joinpath(subdir).joinpath("mite_data/data").resolve(),
-            dst=self.location.resolve(),
-        )
+    def download_stream(self, files_url: str) -> None:
+        """Download the record file as a single stream
 
-        shutil.move(
-            src=self.record_unzip.joinpath(subdir)
-            .joinpath("mite_data/fasta")
-            .resolve(),
-            dst=self.location.resolve(),
-        )
+        Arguments:
+            files_url: the URL of the record file
 
-        os.remove(self.record)
-        shutil.rmtree(self.record_unzip)
+        Raises:
+            RuntimeError: Could not download files
+        """
+        with requests.get(files_url, stream=True, timeout=60) as response_data:
+            if response_data.status_code != 200:
+                logger.fatal(
+                    f"Error downloading 'mite_data' record: {response_data.status_code}"
+                )
+                raise RuntimeError
 
+            response_data.raw.decode_content = True
+            with open(self.record_zip, "wb") as f:
+                shutil.copyfileobj(response_data.raw, f, length=1024 * 1024)
 
+    def organize_data(self) -> None:
+        """Extracts data and fasta files from the record, cleans up
+
+        Only members below mite_data/data and mite_data/fasta are extracted, directly to
+        their final location.
+
+        Raises:
+            RuntimeError: Could not determine data location in downloaded folder
+        """
+        with zipfile.ZipFile(self.record_zip) as zf:
+            members = zf.infolist()
+
+            prefix = next(
+                (
+                    member.filename.split("/")[0]
+                    for member in members
+                    if member.filename.startswith("mite-standard-mite_data-")
+                ),
+                None,
+            )
+            if prefix is None:
+                logger.fatal(
+                    "Could not determine data storage location in downloaded directory."
+                )
+                raise RuntimeError
+
+            for member in members:
+                parts = member.filename.split("/")
+                if (
+                    len(parts) > 3
+                    and parts[0] == prefix
+                    and parts[1] == "mite_data"
+                    and parts[2] in ("data", "fasta")
+                ):
+                    member.filename = "/".join(parts[2:])
+                    zf.extract(member, self.location)
+
+        os.remove(self.record_zip)
+
+
+@dataclass(slots=True, kw_only=True)
 class MetadataManager(AbstractManager):
     """Class to generate metadata file
 
-    metadata: a dict containing metadata
+    rows: a list of dicts containing metadata, one per MITE entry
     datapoints: all mite entries flattened to count datapoints
     """
 
-    metadata: dict = {
-        "key": [],
-        "mite_acc": [],
-        "enzyme_name": [],
-        "enzyme_description": [],
-        "tailoring": [],
-        "id_uniprot": [],
-        "id_genpept": [],
-        "id_mibig": [],
-        "rhea_mibig": [],
-    }
-    datapoints: list = []
+    rows: list = field(default_factory=list)
+    datapoints: list = field(default_factory=list)
 
-    def run(self) -> None:
-        """Iterate over MITE fasta files to prepare metadata"""
+    def run(self) -> pd.DataFrame:
+        """Iterate over MITE fasta files to prepare metadata
+
+        Returns:
+            The metadata DataFrame, also written to mite_metadata.csv
+        """
+
+        with os.scandir(self.fasta) as entries:
+            fastas = [
+                entry.path
+                for entry in entries
+                if entry.is_file(follow_symlinks=False)
+                and entry.name.endswith((".fasta", ".fa"))
+            ]
 
-        for idx, fasta in enumerate(self.fasta.iterdir()):
+        accs = []
+        for fasta in fastas:
             with open(fasta) as infile:
-                lines = infile.read()
-                split_lines = lines.splitlines()
-                mite_acc = split_lines[0].split()[0].strip(">")
+                accs.append(infile.readline().split()[0].strip(">"))
+
+        with ProcessPoolExecutor() as executor:
+            results = list(
+                executor.map(
+                    self.extract_mite,
+                    accs,
+                    range(len(accs)),
+                    [self.data] * len(accs),
+                    chunksize=16,
+                )
+            )
 
-            self.extract_mite(idx=idx, acc=mite_acc)
+        tailoring_pairs = []
+        for row, tailoring, datapoints in results:
+            self.rows.append(row)
+            tailoring_pairs.extend((row["mite_acc"], label) for label in tailoring)
+            self.datapoints.extend(datapoints)
 
         self.output.mkdir(exist_ok=True)
 
-        df1 = pd.DataFrame(self.metadata)
+        df1 = pd.DataFrame.from_records(self.rows)
+
+        df_tailoring = pd.DataFrame(
+            tailoring_pairs, columns=["mite_acc", "tailoring"]
+        ).drop_duplicates()
+        grouped = df_tailoring.groupby("mite_acc")["tailoring"]
+        categ = grouped.first().where(grouped.size() == 1, "Multiple")
+        df1.insert(
+            loc=df1.columns.get_loc("enzyme_description") + 1,
+            column="tailoring",
+            value=df1["mite_acc"].map(categ).fillna(""),
+        )
+
         df1.to_csv(Path(self.output).joinpath("mite_metadata.csv"), index=False)
 
         with open(Path(self.output).joinpath("flat_mite.csv"), 'w') as f:
 
-            cleaned = []
+            seen = set()
             for line in self.datapoints:
-                if "changelog" in line[0]:
-                    continue
-                elif "accession" in line[0]:
-                    continue
-                elif "comment" in line[0]:
-                    continue
-                elif "retirementReasons" in line[0]:
-                    continue
-                elif "status" in line[0]:
-                    continue
-                else:
-                    cleaned.append(line)
-
-            for line in set(cleaned):
-                f.write(f"{line}\n")
-
-    def extract_mite(self, acc: str, idx: int) -> None:
+                if line not in seen:
+                    seen.add(line)
+                    f.write(f"{line}\n")
+
+        return df1
+
+    @staticmethod
+    def extract_mite(acc: str, idx: int, data: Path) -> tuple[dict, list, list]:
         """Extracts metadata for SSN from mite files
 
+        Static to allow dispatching to worker processes
+
         Arguments:
             acc: a MITE accession
             idx: the current loop index
-        """
-        with open(self.data.joinpath(f"{acc}.json")) as mite_file:
-            mite_data = json.load(mite_file)
+            data: path to mite_data json files
 
-        flattened = self.flatten(mite_data)
-        self.datapoints.extend(flattened)
-
-        self.metadata["key"].append(f"{idx}".rjust(7, "z"))
-        self.metadata["mite_acc"].append(mite_data["accession"])
-        self.metadata["enzyme_name"].append(
-            mite_data["enzyme"].get("name", "").replace(",", "")
-        )
-        self.metadata["enzyme_description"].append(
-            mite_data["enzyme"].get("description", "").replace(",", "")
-        )
-        categ = "|".join(
-            sorted(
-                {
-                    tailoring
-                    for reaction in mite_data.get("reactions")
-                    for tailoring in reaction.get("tailoring", [])
-                }
-            )
-        )
-        if re.search(r"\|", categ):
-            self.metadata["tailoring"].append("Multiple")
-        else:
-            self.metadata["tailoring"].append(categ)
-
-        self.metadata["id_uniprot"].append(
-            mite_data["enzyme"]["databaseIds"].get("uniprot", "")
-        )
-        self.metadata["id_genpept"].append(
-            mite_data["enzyme"]["databaseIds"].get("genpept", "")
-        )
-        self.metadata["id_mibig"].append(
-            mite_data["enzyme"]["databaseIds"].get("mibig", "")
+        Returns:
+            A tuple of the metadata row, the tailoring labels and the flattened datapoints
+        """
+        mite_data = orjson.loads(MetadataManager.read_file(data.joinpath(f"{acc}.json")))
+
+        datapoints = MetadataManager.flatten(mite_data)
+
+        enzyme = mite_data["enzyme"]
+        dbids = enzyme.get("databaseIds", {})
+        reactions = mite_data.get("reactions", []) or []
+
+        row = {
+            "key": f"{idx}".rjust(7, "z"),
+            "mite_acc": mite_data["accession"],
+            "enzyme_name": enzyme.get("name", "").replace(",", ""),
+            "enzyme_description": enzyme.get("description", "").replace(",", ""),
+            "id_uniprot": dbids.get("uniprot", ""),
+            "id_genpept": dbids.get("genpept", ""),
+            "id_mibig": dbids.get("mibig", ""),
+        }
+        tailoring = [
+            label for reaction in reactions for label in reaction.get("tailoring", [])
+        ]
+
+        flag_rhea = any(
+            reaction.get("databaseIds", {}).get("rhea") for reaction in reactions
         )
 
-        flag_rhea = False
-        try:
-            for reaction in mite_data["reactions"]:
-                if reaction.get("databaseIds", {}).get("rhea"):
-                    flag_rhea = True
-        except KeyError:
-            logger.info(f"{acc} does not have a database reference - pass")
-
-        if flag_rhea and mite_data["enzyme"]["databaseIds"].get("mibig"):
-            self.metadata["rhea_mibig"].append("Rhea+MIBiG")
+        if flag_rhea and row["id_mibig"]:
+            row["rhea_mibig"] = "Rhea+MIBiG"
         elif flag_rhea:
-            self.metadata["rhea_mibig"].append("Rhea")
-        elif mite_data["enzyme"]["databaseIds"].get("mibig"):
-            self.metadata["rhea_mibig"].append("MIBiG")
+            row["rhea_mibig"] = "Rhea"
+        elif row["id_mibig"]:
+            row["rhea_mibig"] = "MIBiG"
         else:
-            self.metadata["rhea_mibig"].append("No crosslink")
+            row["rhea_mibig"] = "No crosslink"
+
+        return row, tailoring, datapoints
 
-    def flatten(self, data: dict, parent_key=''):
+    @staticmethod
+    def read_file(path: Path) -> bytes:
+        """Reads a small file with a single read call, bypassing Python file buffering
+
+        Args:
+            path: path to the file
+
+        Returns:
+            The file content
+        """
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            return os.read(fd, os.fstat(fd).st_size)
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def flatten(
+        data: dict,
+        exclude: tuple = (
+            "changelog",
+            "accession",
+            "comment",
+            "retirementReasons",
+            "status",
+        ),
+    ) -> list:
         """Extracts data points from MITE entries
 
+        Subtrees below a key containing one of the excluded words are skipped
+        without building their key strings.
+
         Args:
             data: a MITE dict
+            exclude: words marking keys not counted as datapoints
+
+        Returns:
+            A list of (key, value) tuples of all retained leaf values
         """
         items = []
-
-        if isinstance(data, dict):
-            for k, v in data.items():
-                new_key = f"{parent_key}.{k}" if parent_key else k
-                items.extend(self.flatten(v, new_key))
-        elif isinstance(data, list):
-            for i, v in enumerate(data):
-                new_key = f"{parent_key}[{i}]"
-                items.extend(self.flatten(v, new_key))
-        else:
-            items.append((parent_key, data))
+        stack = [("", data)]
+
+        while stack:
+            parent_key, node = stack.pop()
+            if type(node) is dict:
+                for k, v in reversed(node.items()):
+                    if any(word in k for word in exclude):
+                        continue
+                    stack.append((f"{parent_key}.{k}" if parent_key else k, v))
+            elif type(node) is list:
+                for i in range(len(node) - 1, -1, -1):
+                    stack.append((f"{parent_key}[{i}]", node[i]))
+            else:
+                items.append((parent_key, node))
 
         return items
 
 
 
+@dataclass(slots=True, kw_only=True)
 class PlotManager(AbstractManager):
     """Organizes code for plotting"""
 
-    def run(self) -> None:
+    def run(self, df: pd.DataFrame | None = None) -> None:
+        """Creates plots from metadata
 
-        infile = self.output.joinpath("mite_metadata.csv")
+        Args:
+            df: the metadata DataFrame; read from mite_metadata.csv if not provided
+        """
+        if df is None:
+            infile = self.output.joinpath("mite_metadata.csv")
 
-        if not infile.exists():
-            logger.warning(f"Could not find input data '{infile}' - SKIP")
+            if not infile.exists():
+                logger.warning(f"Could not find input data '{infile}' - SKIP")
 
-        df = pd.read_csv(infile)
+            df = pd.read_csv(infile)
 
-        self.plot_countplot(df)
-        self.plot_pieplot(df)
+        tailoring_counts = df["tailoring"].replace("", pd.NA).value_counts()
+        rhea_counts = df["rhea_mibig"].value_counts()
 
+        self.plot_countplot(tailoring_counts)
+        self.plot_pieplot(rhea_counts)
 
-    def plot_countplot(self, df: pd.DataFrame):
+
+    def plot_countplot(self, value_counts: pd.Series):
         """Plot of tailoring labels"""
 
-        df_sorted = df.sort_values(by=["tailoring"], ascending=True)
-        plt.figure(figsize=(8, 6))
-        sns.countplot(y="tailoring", data=df_sorted)
+        counts = value_counts.sort_index()
+        fig, ax = plt.subplots(figsize=(8, 6))
+        ax.barh(counts.index.astype(str), counts.values)
+        ax.invert_yaxis()
+        ax.set_ylabel("tailoring")
 
         plt.tight_layout()
         plt.xlabel("Category", fontsize=10)
@@ -329,10 +476,11 @@ class PlotManager(AbstractManager):
         plt.clf()
         plt.close()
 
-    def plot_pieplot(self, df: pd.DataFrame):
+    def plot_pieplot(self, value_counts: pd.Series):
         """Plot of mibig/rhea crosslink labels"""
-        df_sorted = df.sort_values(by=["rhea_mibig"], ascending=True)
-        value_counts = df_sorted["rhea_mibig"].value_counts()
+        value_counts = value_counts.sort_index().sort_values(
+            ascending=False, kind="stable"
+        )
 
         plt.figure(figsize=(4, 4))
         plt.pie(
@@ -340,7 +488,7 @@ class PlotManager(AbstractManager):
             labels=value_counts.index,
             autopct="%1.1f%%",
             startangle=90,
-            colors=sns.color_palette("Set2", len(value_counts)),
+            colors=plt.get_cmap("Set2").colors[: len(value_counts)],
         )
 
         plt.tight_layout()
@@ -369,10 +517,10 @@ def main() -> None:
     download_manager.run()
 
     metadata_manager = MetadataManager()
-    metadata_manager.run()
+    df = metadata_manager.run()
 
     plot_manager = PlotManager()
-    plot_manager.run()
+    plot_manager.run(df=df)
 
 
 if __name__ == "__main__":
@@ -23,24 +23,31 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from io import BytesIO
 import json
 import logging
 import os
 from pathlib import Path
+import re
 import shutil
 import sys
+import threading
 import time
+import zipfile
 
 import argparse
 from Bio import SeqIO
-from Bio.Blast import NCBIWWW, NCBIXML
+from lxml import etree
 import matplotlib.pyplot as plt
 import matplotlib.ticker as ticker
 import numpy as np
+import orjson
 import pandas as pd
-from pydantic import BaseModel
 import requests
 import seaborn as sns
+import zstandard as zstd
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -48,7 +55,8 @@ console_handler = logging.StreamHandler()
 logger.addHandler(console_handler)
 
 
-class AbstractManager(BaseModel):
+@dataclass(slots=True, kw_only=True)
+class AbstractManager:
     """Class to contain general attributes
 
     data: path to mite_data json files
@@ -63,22 +71,23 @@ class AbstractManager(BaseModel):
     output: Path = Path(__file__).parent.joinpath("output")
 
 
+@dataclass(slots=True, kw_only=True)
 class DownloadManager(AbstractManager):
     """Download files from Zenodo record and unpack
 
     Attributes:
         record: the record to download
         location: the location to download data to
-        record: path to the record file
-        record_unzip: path to unzipped record file
+        record_zip: path to the downloaded record zip file
         version: path to file containing the version of mite_data used
+        metadata_cache: path to cached Zenodo record metadata
     """
 
     record: str
     location: Path = Path(__file__).parent.joinpath("data")
-    record: Path = Path(__file__).parent.joinpath("data/record.zip")
-    record_unzip: Path = Path(__file__).parent.joinpath("data/record")
+    record_zip: Path = Path(__file__).parent.joinpath("data/record.zip")
     version: Path = Path(__file__).parent.joinpath("version.json")
+    metadata_cache: Path = Path.home().joinpath(".cache/mite_ms/zenodo")
 
     def run(self) -> None:
         """Call methods for downloading and moving data"""
@@ -99,149 +108,304 @@ class DownloadManager(AbstractManager):
         Raises:
             RuntimeError: Could not download files
         """
-        response_metadata = requests.get(
-            f"https://zenodo.org/api/records/{self.record}"
-        )
-        if response_metadata.status_code != 200:
-            logger.fatal(
-                f"Error fetching 'mite_data' record metadata: {response_metadata.status_code}"
-            )
-            raise RuntimeError
+        with requests.Session() as session:
+            metadata_file = self.metadata_cache.joinpath(f"{self.record}.json")
+            if metadata_file.exists():
+                record_metadata = orjson.loads(metadata_file.read_bytes())
+            else:
+                response_metadata = session.get(
+                    f"https://zenodo.org/api/records/{self.record}"
+                )
+                if response_metadata.status_code != 200:
+                    logger.fatal(
+                        f"Error fetching 'mite_data' record metadata: {response_metadata.status_code}"
+                    )
+                    raise RuntimeError
+
+                record_metadata = orjson.loads(response_metadata.content)
+                self.metadata_cache.mkdir(parents=True, exist_ok=True)
+                tmp_file = metadata_file.with_suffix(".tmp")
+                tmp_file.write_bytes(orjson.dumps(record_metadata))
+                os.replace(tmp_file, metadata_file)
+            version = record_metadata["metadata"]["version"]
+            files_url = record_metadata["files"][0]["links"]["self"]
+
+            with session.get(files_url, stream=True) as response_data:
+                if response_data.status_code != 200:
+                    logger.fatal(
+                        f"Error downloading 'mite_data' record: {response_data.status_code}"
+                    )
+                    raise RuntimeError
+
+                with open(self.version, "w") as f:
+                    f.write(json.dumps({"version_mite_data_used": f"{version}"}))
+
+                response_data.raw.decode_content = True
+                with open(self.record_zip, "wb") as f:
+                    shutil.copyfileobj(response_data.raw, f, length=1024 * 1024)
 
-        record_metadata = response_metadata.json()
-        version = record_metadata["metadata"]["version"]
-        files_url = record_metadata["files"][0]["links"]["self"]
+    def organize_data(self) -> None:
+        """Extracts data files from the record, cleans up
 
-        response_data = requests.get(files_url)
-        if response_data.status_code != 200:
-            logger.fatal(
-                f"Error downloading 'mite_data' record: {response_data.status_code}"
+        Only members below mite_data/data and mite_data/fasta are extracted, directly to their final
+        location.
+
+        Raises:
+            RuntimeError: Could not determine data location in downloaded folder
+        """
+        with zipfile.ZipFile(self.record_zip) as zf:
+            members = zf.infolist()
+
+            prefix = next(
+                (
+                    member.filename.split("/")[0]
+                    for member in members
+                    if member.filename.startswith("mite-standard-mite_data-")
+                ),
+                None,
             )
-            raise RuntimeError
+            if prefix is None:
+                logger.fatal(
+                    "Could not determine data storage location in downloaded directory."
+                )
+                raise RuntimeError
 
-        with open(self.version, "w") as f:
-            f.write(json.dumps({"version_mite_data_used": f"{version}"}))
+            for member in members:
+                parts = member.filename.split("/")
+                if (
+                    len(parts) > 3
+                    and parts[0] == prefix
+                    and parts[1] == "mite_data"
+                    and parts[2] in ("data", "fasta")
+                ):
+                    member.filename = "/".join(parts[2:])
+                    zf.extract(member, self.location)
 
-        with open(self.record, "wb") as f:
-            f.write(response_data.content)
+        os.remove(self.record_zip)
 
-    def organize_data(self) -> None:
-        """Unpacks data, moves to convenient location, cleans up
 
-        Raises:
-            NotADirectoryError: directory not unzipped in expected location
-            RuntimeError: Could not determine data location in downloaded folder
+@dataclass(slots=True, kw_only=True)
+class BlastManager(AbstractManager):
+    """Class to annotate MITE entries against NCBI-NR using their BLAST API
+
+    Queries are submitted one at a time, with at most max_queries searches running
+    at once; waiting for and downloading results happens in worker threads. All
+    requests to NCBI share one throttle.
+
+    Attributes:
+        url: the NCBI BLAST URL API endpoint
+        max_queries: maximum number of concurrently running searches
+        min_interval: minimum number of seconds between two requests to NCBI
+    """
+
+    url: str = "https://blast.ncbi.nlm.nih.gov/Blast.cgi"
+    max_queries: int = 3
+    min_interval: float = 10
+    last_request: float = field(default=0.0, init=False)
+    request_lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def run(self):
+        self.ncbi_results.mkdir(exist_ok=True)
+        with os.scandir(self.ncbi_results) as entries:
+            done = {
+                entry.name.split(".")[0]
+                for entry in entries
+                if entry.name.endswith((".xml", ".xml.zst"))
+            }
+
+        slots = threading.BoundedSemaphore(self.max_queries)
+
+        with ThreadPoolExecutor(max_workers=self.max_queries) as executor:
+            futures = []
+            for fasta in self.fasta.iterdir():
+                if fasta.stem in done:
+                    continue
+
+                record = SeqIO.read(fasta, "fasta")
+
+                slots.acquire()
+                try:
+                    logger.info(f"Submitting BLASTp entry of {record.id}")
+                    rid, rtoe = self.submit_query(f">{record.id}\n{record.seq}\n")
+                except Exception:
+                    slots.release()
+                    raise
+
+                futures.append(
+                    executor.submit(self.fetch_results, record.id, rid, rtoe, slots)
+                )
+
+            for future in as_completed(futures):
+                future.result()
+
+    def throttle(self) -> None:
+        """Waits until min_interval seconds have passed since the last NCBI request
+
+        Limits the rate across all threads to prevent IP ban by NCBI
         """
-        shutil.unpack_archive(
-            filename=self.record, extract_dir=self.record_unzip, format="zip"
-        )
-        if not self.record_unzip.exists():
-            logger.fatal(f"Could not find the unzipped directory {self.record_unzip}.")
-            raise NotADirectoryError
+        with self.request_lock:
+            wait = self.last_request + self.min_interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self.last_request = time.monotonic()
 
-        matching_dirs = list(self.record_unzip.glob("mite-standard-mite_data-*"))
-        if not matching_dirs:
-            logger.fatal(
-                f"Could not determine data storage location in downloaded directory."
-            )
-            raise RuntimeError
+    def submit_query(self, query: str) -> tuple[str, int]:
+        """Submits a BLASTp search against NCBI NR
 
-        subdir = matching_dirs[0]
+        Arguments:
+            query: a fasta-formatted protein sequence
 
-        shutil.move(
-            src=self.record_unzip.joinpath(subdir).joinpath("mite_data/data").resolve(),
-            dst=self.location.resolve(),
-        )
+        Raises:
+            RuntimeError: Could not submit the search
 
-        shutil.move(
-            src=self.record_unzip.joinpath(subdir)
-            .joinpath("mite_data/fasta")
-            .resolve(),
-            dst=self.location.resolve(),
+        Returns:
+            A tuple of the request ID and the estimated time to completion in seconds
+        """
+        self.throttle()
+        response = requests.post(
+            self.url,
+            data={
+                "CMD": "Put",
+                "PROGRAM": "blastp",
+                "DATABASE": "nr",
+                "QUERY": query,
+                "EXPECT": 1e-5,
+                "HITLIST_SIZE": 5000,  # Maximum results
+                "FORMAT_TYPE": "XML",
+                "TOOL": "mite_ms",
+            },
+            timeout=60,
         )
+        rid = re.search(r"RID = (\S+)", response.text)
+        rtoe = re.search(r"RTOE = (\d+)", response.text)
+        if response.status_code != 200 or rid is None:
+            logger.fatal(f"Error submitting BLAST search: {response.status_code}")
+            raise RuntimeError
 
-        os.remove(self.record)
-        shutil.rmtree(self.record_unzip)
+        return rid.group(1), int(rtoe.group(1)) if rtoe else 60
 
+    def fetch_results(
+        self, record_id: str, rid: str, rtoe: int, slots: threading.BoundedSemaphore
+    ) -> None:
+        """Waits for a BLAST search to finish and saves the zstd-compressed XML result
 
-class BlastManager(AbstractManager):
-    """Class to annotate MITE entries against NCBI-NR using their BLAST API"""
+        Arguments:
+            record_id: the MITE accession of the query
+            rid: the BLAST request ID
+            rtoe: the estimated time to completion in seconds
+            slots: semaphore released when the search is finished
 
-    def run(self):
-        self.ncbi_results.mkdir(exist_ok=True)
+        Raises:
+            RuntimeError: BLAST search failed or expired, or returned no BLAST XML
+        """
+        try:
+            time.sleep(rtoe)
+            while True:
+                self.throttle()
+                response = requests.get(
+                    self.url,
+                    params={"CMD": "Get", "FORMAT_OBJECT": "SearchInfo", "RID": rid},
+                    timeout=60,
+                )
+                if "Status=READY" in response.text:
+                    break
+                if "Status=WAITING" not in response.text:
+                    logger.fatal(f"BLAST search of {record_id} ({rid}) failed")
+                    raise RuntimeError
+
+                time.sleep(60)  # NCBI asks to poll each RID at most once a minute
+
+            self.throttle()
+            response = requests.get(
+                self.url,
+                params={"CMD": "Get", "FORMAT_TYPE": "XML", "RID": rid},
+                timeout=300,
+            )
+        finally:
+            slots.release()
 
-        for fasta in self.fasta.iterdir():
-            if self.ncbi_results.joinpath(f"{fasta.stem}.xml").exists():
-                continue
-
-            record = SeqIO.read(fasta, "fasta")
-            query = f""">{record.id}
-            {record.seq}
-            """
-
-            logger.info(f"Submitting BLASTp entry of {record.id}")
-            result_handle = NCBIWWW.qblast(
-                program="blastp",
-                database="nr",
-                sequence=query,
-                expect=1e-5,
-                hitlist_size=5000,  # Maximum results
-                format_type="XML",
+        if response.status_code != 200 or b"<BlastOutput" not in response.content:
+            logger.fatal(
+                f"Error fetching BLAST results of {record_id} ({rid}): {response.status_code}"
             )
-            raw_blast_output = result_handle.read()
-            with open(self.ncbi_results.joinpath(f"{record.id}.xml"), "w") as file:
-                file.write(raw_blast_output)
+            raise RuntimeError
 
-            logger.info("BLAST search completed. Results saved.")
+        with open(self.ncbi_results.joinpath(f"{record_id}.xml.zst"), "wb") as file:
+            file.write(zstd.ZstdCompressor(level=10).compress(response.content))
 
-            time.sleep(10)  # limits rate to prevent IP ban by NCBI
+        logger.info(f"BLAST search of {record_id} completed. Results saved.")
 
 
+@dataclass(slots=True, kw_only=True)
 class MetadataManager(AbstractManager):
     """Class to generate metadata files for EFI-EST
 
     metadata_efi_est: a dict containing efi-est formatted metadata
-    fasta_efi_est: buffer for concatenating
+    nr_blast_matches: a dict containing NCBI NR BLAST matches
     """
 
-    metadata_efi_est: dict = {
-        "key": [],
-        "mite_acc": [],
-        "enzyme_name": [],
-        "enzyme_description": [],
-        "tailoring": [],
-        "id_uniprot": [],
-        "id_genpept": [],
-        "id_mibig": [],
-        "ncbi_nr_matches": [],
-    }
-    fasta_efi_est: list = []
-    nr_blast_matches: dict = {
-        "mite_acc": [],
-        "accession": [],
-        "length": [],
-        "e_value": [],
-        "score": [],
-        "bitscore": [],
-        "percent_sim": [],
-        "percent_id": [],
-    }
+    metadata_efi_est: dict = field(
+        default_factory=lambda: {
+            "key": [],
+            "mite_acc": [],
+            "enzyme_name": [],
+            "enzyme_description": [],
+            "tailoring": [],
+            "id_uniprot": [],
+            "id_genpept": [],
+            "id_mibig": [],
+            "ncbi_nr_matches": [],
+        }
+    )
+    nr_blast_matches: dict = field(
+        default_factory=lambda: {
+            "mite_acc": [],
+            "accession": [],
+            "length": [],
+            "e_value": [],
+            "score": [],
+            "bitscore": [],
+            "percent_sim": [],
+            "percent_id": [],
+        }
+    )
 
     def run(self) -> None:
         """Iterate over MITE fasta files to prepare metadata"""
 
-        for idx, fasta in enumerate(self.fasta.iterdir()):
-            with open(fasta) as infile:
-                lines = infile.read()
-                split_lines = lines.splitlines()
-                mite_acc = split_lines[0].split()[0].strip(">")
+        self.output.mkdir(exist_ok=True)
 
-            self.extract_mite(idx=idx, acc=mite_acc)
-            self.extract_xml(acc=mite_acc)
+        with os.scandir(self.fasta) as entries:
+            fastas = [entry.path for entry in entries if entry.is_file()]
 
-            self.fasta_efi_est.append(f"{lines}\n")
+        with open(Path(self.output).joinpath("mite_ssn_seqs.fasta"), "wb") as outfile:
+            for fasta in fastas:
+                with open(fasta, "rb") as infile:
+                    shutil.copyfileobj(infile, outfile, length=1024 * 1024)
 
-        self.output.mkdir(exist_ok=True)
+                outfile.write(b"\n")
+
+        keys = [str(idx).rjust(7, "z") for idx in range(len(fastas))]
+
+        with ProcessPoolExecutor() as executor:
+            results = list(
+                executor.map(
+                    self.process_accession,
+                    fastas,
+                    keys,
+                    [self.data] * len(fastas),
+                    [self.ncbi_results] * len(fastas),
+                    chunksize=8,
+                )
+            )
+
+        self.metadata_efi_est = {
+            key: [row[key] for row, _ in results] for key in self.metadata_efi_est
+        }
+
+        for _, matches in results:
+            for key, value in matches.items():
+                self.nr_blast_matches[key].extend(value)
 
         df1 = pd.DataFrame(self.metadata_efi_est)
         df1.to_csv(Path(self.output).joinpath("mite_ssn_metadata.csv"), index=False)
@@ -249,31 +413,55 @@ class MetadataManager(AbstractManager):
         df2 = pd.DataFrame(self.nr_blast_matches)
         df2.to_csv(Path(self.output).joinpath("blast_matches_details.csv"), index=False)
 
-        with open(
-            Path(self.output).joinpath("mite_ssn_seqs.fasta"), "w", encoding="utf-8"
-        ) as outfile:
-            outfile.writelines(self.fasta_efi_est)
+    @staticmethod
+    def process_accession(
+        fasta: str, key: str, data: Path, ncbi_results: Path
+    ) -> tuple[dict, dict]:
+        """Extracts metadata and BLAST matches of a single MITE accession
 
-    def extract_mite(self, acc: str, idx: int) -> None:
-        """Extracts metadata for SSN from mite files
+        Static to allow dispatching to worker processes; all files of an accession
+        are read by the same worker.
 
         Arguments:
-            acc: a MITE accession
-            idx: the current loop index
+            fasta: path to the fasta file of the MITE accession
+            key: the EFI-EST key of the entry
+            data: path to mite_data json files
+            ncbi_results: path to NCBI NR BLAST results
+
+        Returns:
+            A tuple of the efi-est metadata row and the BLAST match columns
         """
-        with open(self.data.joinpath(f"{acc}.json")) as mite_file:
-            mite_data = json.load(mite_file)
+        with open(fasta) as infile:
+            acc = infile.readline().split()[0].strip(">")
 
-        self.metadata_efi_est["key"].append(f"{idx}".rjust(7, "z"))
-        self.metadata_efi_est["mite_acc"].append(mite_data["accession"])
-        self.metadata_efi_est["enzyme_name"].append(
-            mite_data["enzyme"].get("name", "").replace(",", "")
-        )
-        self.metadata_efi_est["enzyme_description"].append(
-            mite_data["enzyme"].get("description", "").replace(",", "")
+        row = MetadataManager.extract_mite(acc=acc, key=key, data=data)
+        row["ncbi_nr_matches"], matches = MetadataManager.extract_xml(
+            acc=acc, ncbi_results=ncbi_results
         )
-        self.metadata_efi_est["tailoring"].append(
-            "|".join(
+        return row, matches
+
+    @staticmethod
+    def extract_mite(acc: str, key: str, data: Path) -> dict:
+        """Extracts metadata for SSN from mite files
+
+        Arguments:
+            acc: a MITE accession
+            key: the EFI-EST key of the entry
+            data: path to mite_data json files
+
+        Returns:
+            The efi-est metadata row without the NCBI NR match count
+        """
+        mite_data = orjson.loads(data.joinpath(f"{acc}.json").read_bytes())
+
+        return {
+            "key": key,
+            "mite_acc": mite_data["accession"],
+            "enzyme_name": mite_data["enzyme"].get("name", "").replace(",", ""),
+            "enzyme_description": mite_data["enzyme"]
+            .get("description", "")
+            .replace(",", ""),
+            "tailoring": "|".join(
                 sorted(
                     {
                         tailoring
@@ -281,51 +469,77 @@ class MetadataManager(AbstractManager):
                         for tailoring in reaction.get("tailoring", [])
                     }
                 )
-            )
-        )
-        self.metadata_efi_est["id_uniprot"].append(
-            mite_data["enzyme"]["databaseIds"].get("uniprot", "")
-        )
-        self.metadata_efi_est["id_genpept"].append(
-            mite_data["enzyme"]["databaseIds"].get("genpept", "")
-        )
-        self.metadata_efi_est["id_mibig"].append(
-            mite_data["enzyme"]["databaseIds"].get("mibig", "")
-        )
+            ),
+            "id_uniprot": mite_data["enzyme"]["databaseIds"].get("uniprot", ""),
+            "id_genpept": mite_data["enzyme"]["databaseIds"].get("genpept", ""),
+            "id_mibig": mite_data["enzyme"]["databaseIds"].get("mibig", ""),
+        }
 
-    def extract_xml(self, acc: str) -> None:
+    @staticmethod
+    def extract_xml(acc: str, ncbi_results: Path) -> tuple[int, dict]:
         """Extracts metadata for SSN from BLAST XML file
 
-        Counts matches >= 95% similarity and adds to efi-est metadata
-        Also stores matches >= 95% similarity for dumping as csv
+        Counts matches >= 70% similarity and collects them for dumping as csv
+        Reads zstd-compressed results, or uncompressed ones from earlier runs
 
         Arguments:
             acc: a MITE accession
-        """
-        with open(self.ncbi_results.joinpath(f"{acc}.xml")) as xml_file:
-            blast_record = NCBIXML.read(xml_file)
-
-        counter = 0
-        for alignment in blast_record.alignments:
-            for hsp in alignment.hsps:
-                sim_perc = round((hsp.positives / hsp.align_length) * 100, 2)
-                id_perc = round((hsp.identities / hsp.align_length) * 100, 2)
-
-                if sim_perc >= 70:
-                    self.nr_blast_matches["mite_acc"].append(acc)
-                    self.nr_blast_matches["accession"].append(alignment.accession)
-                    self.nr_blast_matches["length"].append(alignment.length)
-                    self.nr_blast_matches["e_value"].append(hsp.expect)
-                    self.nr_blast_matches["score"].append(hsp.score)
-                    self.nr_blast_matches["bitscore"].append(hsp.bits)
-                    self.nr_blast_matches["percent_sim"].append(sim_perc)
-                    self.nr_blast_matches["percent_id"].append(id_perc)
-
-                    counter += 1
-
-        self.metadata_efi_est["ncbi_nr_matches"].append(counter)
-
+            ncbi_results: path to NCBI NR BLAST results
 
+        Returns:
+            A tuple of the match count and the BLAST match columns
+        """
+        hits = {
+            "accession": [],
+            "length": [],
+            "e_value": [],
+            "score": [],
+            "bitscore": [],
+        }
+        positives = []
+        identities = []
+        align_lengths = []
+
+        xml_file = ncbi_results.joinpath(f"{acc}.xml.zst")
+        if xml_file.exists():
+            source = BytesIO(zstd.ZstdDecompressor().decompress(xml_file.read_bytes()))
+        else:
+            source = str(ncbi_results.joinpath(f"{acc}.xml"))
+
+        for _, hit in etree.iterparse(source, events=("end",), tag="Hit"):
+            accession = hit.findtext("Hit_accession")
+            length = int(hit.findtext("Hit_len"))
+
+            for hsp in hit.iterfind("Hit_hsps/Hsp"):
+                hits["accession"].append(accession)
+                hits["length"].append(length)
+                hits["e_value"].append(float(hsp.findtext("Hsp_evalue")))
+                hits["score"].append(float(hsp.findtext("Hsp_score")))
+                hits["bitscore"].append(float(hsp.findtext("Hsp_bit-score")))
+                positives.append(int(hsp.findtext("Hsp_positive")))
+                identities.append(int(hsp.findtext("Hsp_identity")))
+                align_lengths.append(int(hsp.findtext("Hsp_align-len")))
+
+            hit.clear(keep_tail=True)
+            while hit.getprevious() is not None:
+                del hit.getparent()[0]
+
+        align_length = np.asarray(align_lengths, dtype=np.int64)
+        sim_perc = np.round((np.asarray(positives) / align_length) * 100, 2)
+        id_perc = np.round((np.asarray(identities) / align_length) * 100, 2)
+        mask = sim_perc >= 70
+        counter = int(mask.sum())
+
+        matches = {"mite_acc": [acc] * counter}
+        for key, values in hits.items():
+            matches[key] = [value for value, keep in zip(values, mask) if keep]
+        matches["percent_sim"] = sim_perc[mask].tolist()
+        matches["percent_id"] = id_perc[mask].tolist()
+
+        return counter, matches
+
+
+@dataclass(slots=True, kw_only=True)
 class PlotManager(AbstractManager):
     """Organizes code for plotting"""
 
@@ -338,20 +552,18 @@ class PlotManager(AbstractManager):
             logger.warning(f"Could not find input data '{infile}' - SKIP")
 
         df = pd.read_csv(infile)
-        df.sort_values(by=["ncbi_nr_matches"], ascending=True, inplace=True)
 
         log_counts = np.log10(df["ncbi_nr_matches"])
         bins = np.linspace(np.floor(min(log_counts)), np.ceil(max(log_counts)), 10)
         hist_vals, bin_edges = np.histogram(log_counts, bins=bins)
 
         fig, ax = plt.subplots(figsize=(3, 3))
-        for i in range(len(hist_vals)):
-            ax.bar(bin_edges[i], hist_vals[i],
-                   width=bin_edges[i + 1] - bin_edges[i],
-                   align='edge',
-                   color="darkgrey",
-                   linewidth=1,
-                   edgecolor='black')
+        ax.bar(bin_edges[:-1], hist_vals,
+               width=np.diff(bin_edges),
+               align='edge',
+               color="darkgrey",
+               linewidth=1,
+               edgecolor='black')
 
         ax.set_xticks([0, 1, 2, 3, 4])
         ax.set_xticklabels(['1', '10', '100', '1,000', '10,000'])
@@ -370,19 +582,21 @@ class PlotManager(AbstractManager):
 
     def write_summary(self, df: pd.DataFrame) -> None:
         """Write data summary of boxplot"""
-        summary = df["ncbi_nr_matches"].describe()
+        arr = df["ncbi_nr_matches"].to_numpy()
+        q25, q50, q75 = np.percentile(arr, [25, 50, 75])
+        iqr = q75 - q25
 
         summary = {
-            "count": summary["count"],
-            "mean": summary["mean"],
-            "std": summary["std"],
-            "25%": summary["25%"],
-            "50%": summary["50%"],
-            "75%": summary["75%"],
-            "max": summary["max"],
-            "iqr": summary["75%"] - summary["25%"],
-            "lower_bound": summary["25%"] - (1.5 * (summary["75%"] - summary["25%"])),
-            "upper_bound": summary["75%"] + (1.5 * (summary["75%"] - summary["25%"])),
+            "count": arr.size,
+            "mean": arr.mean(),
+            "std": arr.std(ddof=1),
+            "25%": q25,
+            "50%": q50,
+            "75%": q75,
+            "max": arr.max(),
+            "iqr": iqr,
+            "lower_bound": q25 - (1.5 * iqr),
+            "upper_bound": q75 + (1.5 * iqr),
         }
 
         json_dict = {key: float(value) for key, value in summary.items()}
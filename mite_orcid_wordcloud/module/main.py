@@ -24,16 +24,20 @@ SOFTWARE.
 """
 
 
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 import json
 import logging
 import os
 from pathlib import Path
 import shutil
 import sys
+import zipfile
 
 import argparse
+import orjson
 import pandas as pd
-from pydantic import BaseModel
 import requests
 
 
@@ -42,7 +46,8 @@ logger.setLevel(logging.INFO)
 console_handler = logging.StreamHandler()
 logger.addHandler(console_handler)
 
-class AbstractManager(BaseModel):
+@dataclass(slots=True, kw_only=True)
+class AbstractManager:
     """Class to contain general attributes
 
     data: path to mite_data json files
@@ -52,22 +57,23 @@ class AbstractManager(BaseModel):
     data: Path = Path(__file__).parent.joinpath("data/data")
     output: Path = Path(__file__).parent.joinpath("output")
 
+@dataclass(slots=True, kw_only=True)
 class DownloadManager(AbstractManager):
     """Download files from Zenodo record and unpack
 
     Attributes:
         record: the record to download
         location: the location to download data to
-        record: path to the record file
-        record_unzip: path to unzipped record file
+        record_zip: path to the downloaded record zip file
         version: path to file containing the version of mite_data used
+        metadata_cache: path to cached Zenodo record metadata
     """
 
     record: str
     location: Path = Path(__file__).parent.joinpath("data")
-    record: Path = Path(__file__).parent.joinpath("data/record.zip")
-    record_unzip: Path = Path(__file__).parent.joinpath("data/record")
+    record_zip: Path = Path(__file__).parent.joinpath("data/record.zip")
     version: Path = Path(__file__).parent.joinpath("version.json")
+    metadata_cache: Path = Path.home().joinpath(".cache/mite_ms/zenodo")
 
     def run(self) -> None:
         """Call methods for downloading and moving data"""
@@ -88,70 +94,90 @@ class DownloadManager(AbstractManager):
         Raises:
             RuntimeError: Could not download files
         """
-        response_metadata = requests.get(
-            f"https://zenodo.org/api/records/{self.record}"
-        )
-        if response_metadata.status_code != 200:
-            logger.fatal(
-                f"Error fetching 'mite_data' record metadata: {response_metadata.status_code}"
-            )
-            raise RuntimeError
-
-        record_metadata = response_metadata.json()
-        version = record_metadata["metadata"]["version"]
-        files_url = record_metadata["files"][0]["links"]["self"]
-
-        response_data = requests.get(files_url)
-        if response_data.status_code != 200:
-            logger.fatal(
-                f"Error downloading 'mite_data' record: {response_data.status_code}"
-            )
-            raise RuntimeError
-
-        with open(self.version, "w") as f:
-            f.write(json.dumps({"version_mite_data_used": f"{version}"}))
-
-        with open(self.record, "wb") as f:
-            f.write(response_data.content)
+        with requests.Session() as session:
+            metadata_file = self.metadata_cache.joinpath(f"{self.record}.json")
+            if metadata_file.exists():
+                record_metadata = orjson.loads(metadata_file.read_bytes())
+            else:
+                response_metadata = session.get(
+                    f"https://zenodo.org/api/records/{self.record}"
+                )
+                if response_metadata.status_code != 200:
+                    logger.fatal(
+                        f"Error fetching 'mite_data' record metadata: {response_metadata.status_code}"
+                    )
+                    raise RuntimeError
+
+                record_metadata = orjson.loads(response_metadata.content)
+                self.metadata_cache.mkdir(parents=True, exist_ok=True)
+                tmp_file = metadata_file.with_suffix(".tmp")
+                tmp_file.write_bytes(orjson.dumps(record_metadata))
+                os.replace(tmp_file, metadata_file)
+            version = record_metadata["metadata"]["version"]
+            files_url = record_metadata["files"][0]["links"]["self"]
+
+            with session.get(files_url, stream=True) as response_data:
+                if response_data.status_code != 200:
+                    logger.fatal(
+                        f"Error downloading 'mite_data' record: {response_data.status_code}"
+                    )
+                    raise RuntimeError
+
+                with open(self.version, "w") as f:
+                    f.write(json.dumps({"version_mite_data_used": f"{version}"}))
+
+                response_data.raw.decode_content = True
+                with open(self.record_zip, "wb") as f:
+                    shutil.copyfileobj(response_data.raw, f, length=1024 * 1024)
 
     def organize_data(self) -> None:
-        """Unpacks data, moves to convenient location, cleans up
+        """Extracts data files from the record, cleans up
+
+        Only members below mite_data/data are extracted, directly to their final
+        location.
 
         Raises:
-            NotADirectoryError: directory not unzipped in expected location
             RuntimeError: Could not determine data location in downloaded folder
         """
-        shutil.unpack_archive(
-            filename=self.record, extract_dir=self.record_unzip, format="zip"
-        )
-        if not self.record_unzip.exists():
-            logger.fatal(f"Could not find the unzipped directory {self.record_unzip}.")
-            raise NotADirectoryError
-
-        matching_dirs = list(self.record_unzip.glob("mite-standard-mite_data-*"))
-        if not matching_dirs:
-            logger.fatal(
-                "Could not determine data storage location in downloaded directory."
+        with zipfile.ZipFile(self.record_zip) as zf:
+            members = zf.infolist()
+
+            prefix = next(
+                (
+                    member.filename.split("/")[0]
+                    for member in members
+                    if member.filename.startswith("mite-standard-mite_data-")
+                ),
+                None,
             )
-            raise RuntimeError
-
-        subdir = matching_dirs[0]
-
-        shutil.move(
-            src=self.record_unzip.joinpath(subdir).joinpath("mite_data/data").resolve(),
-            dst=self.location.resolve(),
-        )
-
-        os.remove(self.record)
-        shutil.rmtree(self.record_unzip)
-
+            if prefix is None:
+                logger.fatal(
+                    "Could not determine data storage location in downloaded directory."
+                )
+                raise RuntimeError
+
+            for member in members:
+                parts = member.filename.split("/")
+                if (
+                    len(parts) > 3
+                    and parts[0] == prefix
+                    and parts[1] == "mite_data"
+                    and parts[2] == "data"
+                ):
+                    member.filename = "/".join(parts[2:])
+                    zf.extract(member, self.location)
+
+        os.remove(self.record_zip)
+
+
+@dataclass(slots=True, kw_only=True)
 class DataManager(AbstractManager):
     """Class to collect data and plot wordcloud
 
     orcids: a list of orcids
     """
 
-    orcids: list = []
+    orcids: list = field(default_factory=list)
 
     def run(self) -> None:
         """Iterate over MITE fasta files to prepare metadata"""
@@ -161,33 +187,46 @@ class DataManager(AbstractManager):
     def extract_data(self) -> None:
         """Pull out orcids from mite files and dump it"""
 
-        for mite in self.data.iterdir():
-            with open(mite) as infile:
-                mite_data = json.load(infile)
-
-            for log in mite_data["changelog"]:
-                self.orcids.extend(log["contributors"])
-                self.orcids.extend(log["reviewers"])
-
-        self.orcids = [word for word in self.orcids if not word == "AAAAAAAAAAAAAAAAAAAAAAAA"]
+        with ProcessPoolExecutor() as executor:
+            for orcids in executor.map(
+                self.orcids_from, self.data.iterdir(), chunksize=32
+            ):
+                self.orcids.extend(orcids)
 
         self.output.mkdir(exist_ok=True)
 
-        frequency = {}
-        for word in self.orcids:
-            if word not in frequency:
-                frequency[word] = 1
-            else:
-                frequency[word] += 1
+        frequency = Counter(
+            word for word in self.orcids if word != "AAAAAAAAAAAAAAAAAAAAAAAA"
+        )
 
         frame = {
-            "weight": [value for value in frequency.values()],
-            "word": [key for key in frequency.keys()]
+            "weight": list(frequency.values()),
+            "word": list(frequency.keys()),
         }
 
         df = pd.DataFrame(frame)
         df.to_csv(self.output.joinpath("orcids.csv"), index=False)
 
+    @staticmethod
+    def orcids_from(path: Path) -> list:
+        """Pull out contributor and reviewer orcids from a single mite file
+
+        Static to allow dispatching to worker processes
+
+        Arguments:
+            path: path to a mite json file
+
+        Returns:
+            A list of orcids in changelog order
+        """
+        mite_data = orjson.loads(path.read_bytes())
+
+        return [
+            orcid
+            for log in mite_data["changelog"]
+            for orcid in (*log["contributors"], *log["reviewers"])
+        ]
+
 def main() -> None:
     """Function to execute main body of code"""
 
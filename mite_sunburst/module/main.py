@@ -4,6 +4,9 @@ from pathlib import Path
 import argparse
 import pandas as pd
 import plotly.express as px
+import plotly.io as pio
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
 import requests
 
 src = Path(__file__).parent.joinpath("summary.csv")
@@ -30,10 +33,27 @@ def plot() -> None:
     inner = "domain"
     outer = "phylum"
 
-    df = pd.read_csv(src)
-    df_clean = df[(df[inner] != "Not found") & (df[outer] != "Not found")]
-    df_clean = df_clean[df_clean["status"] == "active"]
-    sunburst_data = df_clean.groupby([inner, outer]).size().reset_index(name='count')
+    tbl = pa_csv.read_csv(src)
+    tbl = tbl.filter(
+        pc.and_(
+            pc.and_(
+                pc.not_equal(tbl[inner], "Not found"),
+                pc.not_equal(tbl[outer], "Not found"),
+            ),
+            pc.and_(
+                pc.not_equal(tbl[inner], ""),
+                pc.not_equal(tbl[outer], ""),
+            ),
+        )
+    )
+    tbl = tbl.filter(pc.equal(tbl["status"], "active"))
+    sunburst_data = (
+        tbl.group_by([inner, outer])
+        .aggregate([([], "count_all")])
+        .rename_columns([inner, outer, "count"])
+        .sort_by([(inner, "ascending"), (outer, "ascending")])
+        .to_pandas()
+    )
 
     print("Number of retained entries for sunburst plot:")
     print(sunburst_data["count"].sum())
@@ -53,7 +73,9 @@ def plot() -> None:
         uniformtext=dict(minsize=12, mode='show')
     )
 
-    fig.write_image("mite_sunburst_plot.svg", width=250, height=250)
+    pio.write_images(
+        fig=[fig], file=["mite_sunburst_plot.svg"], format="svg", width=250, height=250
+    )
 
 
 def main() -> None:
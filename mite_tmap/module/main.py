@@ -23,25 +23,21 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
-import json
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import cache
 import logging
 import os
-import re
 from pathlib import Path
 import shutil
 import sys
 
-from annoy import AnnoyIndex
 import argparse
-from drfp import DrfpEncoder
-import matplotlib.pyplot as plt
+import numpy as np
+import orjson
 import pandas as pd
 import pickle
-from pydantic import BaseModel
-import requests
-import seaborn as sns
-from scipy.spatial.distance import cosine as cosine_distance
-import tmap as tm
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -49,7 +45,55 @@ console_handler = logging.StreamHandler()
 logger.addHandler(console_handler)
 
 
-class AbstractManager(BaseModel):
+@cache
+def tanimoto_edges_kernel() -> Callable:
+    """Compiles the numba kernel for Tanimoto distances on first use
+
+    numba is imported here to keep it out of the start-up of the download step.
+
+    Returns:
+        The compiled tanimoto_edges function
+    """
+    from numba import njit, prange
+
+    popcount = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    @njit(parallel=True)
+    def tanimoto_edges(
+        fps: np.ndarray,
+        ids: np.ndarray,
+        src_out: np.ndarray,
+        dst_out: np.ndarray,
+        d_out: np.ndarray,
+    ) -> None:
+        """Fill edge arrays with Tanimoto distances from each item to its neighbours
+
+        Arguments:
+            fps: bit-packed fingerprints of shape (N, 256)
+            ids: neighbour ids of shape (N, k)
+            src_out: source ids of shape (N * k)
+            dst_out: target ids of shape (N * k)
+            d_out: Tanimoto distances of shape (N * k)
+        """
+        k = ids.shape[1]
+        for i in prange(ids.shape[0]):
+            for c in range(k):
+                j = ids[i, c]
+                both = 0
+                either = 0
+                for b in range(fps.shape[1]):
+                    both += popcount[fps[i, b] & fps[j, b]]
+                    either += popcount[fps[i, b] | fps[j, b]]
+                e = i * k + c
+                src_out[e] = i
+                dst_out[e] = j
+                d_out[e] = 1.0 - both / max(either, 1)
+
+    return tanimoto_edges
+
+
+@dataclass(slots=True, kw_only=True)
+class AbstractManager:
     """Class to contain general attributes
 
     data: path to mite_data json files
@@ -60,20 +104,21 @@ class AbstractManager(BaseModel):
     output: Path = Path(__file__).parent.joinpath("output")
 
 
+@dataclass(slots=True, kw_only=True)
 class DownloadManager(AbstractManager):
     """Download files from Zenodo record and unpack
 
     Attributes:
         record: the record to download
         location: the location to download data to
-        record: path to the record file
+        record_zip: path to the downloaded record zip file
         record_unzip: path to unzipped record file
         version: path to file containing the version of mite_data used
     """
 
     record: str
     location: Path = Path(__file__).parent.joinpath("data")
-    record: Path = Path(__file__).parent.joinpath("data/record.zip")
+    record_zip: Path = Path(__file__).parent.joinpath("data/record.zip")
     record_unzip: Path = Path(__file__).parent.joinpath("data/record")
     version: Path = Path(__file__).parent.joinpath("version.json")
 
@@ -96,31 +141,37 @@ class DownloadManager(AbstractManager):
         Raises:
             RuntimeError: Could not download files
         """
-        response_metadata = requests.get(
-            f"https://zenodo.org/api/records/{self.record}"
-        )
-        if response_metadata.status_code != 200:
-            logger.fatal(
-                f"Error fetching 'mite_data' record metadata: {response_metadata.status_code}"
-            )
-            raise RuntimeError
+        import requests
 
-        record_metadata = response_metadata.json()
-        version = record_metadata["metadata"]["version"]
-        files_url = record_metadata["files"][0]["links"]["self"]
+        with requests.Session() as session:
+            session.headers.update({"Accept-Encoding": "gzip, deflate"})
 
-        response_data = requests.get(files_url)
-        if response_data.status_code != 200:
-            logger.fatal(
-                f"Error downloading 'mite_data' record: {response_data.status_code}"
+            response_metadata = session.get(
+                f"https://zenodo.org/api/records/{self.record}", timeout=30
             )
-            raise RuntimeError
-
-        with open(self.version, "w") as f:
-            f.write(json.dumps({"version_mite_data_used": f"{version}"}))
-
-        with open(self.record, "wb") as f:
-            f.write(response_data.content)
+            if response_metadata.status_code != 200:
+                logger.fatal(
+                    f"Error fetching 'mite_data' record metadata: {response_metadata.status_code}"
+                )
+                raise RuntimeError
+
+            record_metadata = orjson.loads(response_metadata.content)
+            version = record_metadata["metadata"]["version"]
+            files_url = record_metadata["files"][0]["links"]["self"]
+
+            with session.get(files_url, stream=True, timeout=300) as response_data:
+                if response_data.status_code != 200:
+                    logger.fatal(
+                        f"Error downloading 'mite_data' record: {response_data.status_code}"
+                    )
+                    raise RuntimeError
+
+                with open(self.version, "wb") as f:
+                    f.write(orjson.dumps({"version_mite_data_used": f"{version}"}))
+
+                with open(self.record_zip, "wb") as f:
+                    for chunk in response_data.iter_content(chunk_size=1024 * 1024):
+                        f.write(chunk)
 
     def organize_data(self) -> None:
         """Unpacks data, moves to convenient location, cleans up
@@ -130,7 +181,7 @@ class DownloadManager(AbstractManager):
             RuntimeError: Could not determine data location in downloaded folder
         """
         shutil.unpack_archive(
-            filename=self.record, extract_dir=self.record_unzip, format="zip"
+            filename=self.record_zip, extract_dir=self.record_unzip, format="zip"
         )
         if not self.record_unzip.exists():
             logger.fatal(f"Could not find the unzipped directory {self.record_unzip}.")
@@ -150,110 +201,176 @@ class DownloadManager(AbstractManager):
             dst=self.location.resolve(),
         )
 
-        os.remove(self.record)
+        os.remove(self.record_zip)
         shutil.rmtree(self.record_unzip)
 
 
+@dataclass(slots=True, kw_only=True)
 class DataManager(AbstractManager):
-    """Class to generate data file for plotting
+    """Class to generate data file for plotting"""
 
-    mite_acc: a dict containing mite data
-    """
-
-    mite_data: dict = {
-        "mite_acc": [],
-        "reaction": [],
-        "enzyme_name": [],
-        "enzyme_description": [],
-        "tailoring": [],
-        "id_uniprot": [],
-        "id_genpept": [],
-    }
-
-    def run(self) -> None:
-        """Iterates over MITE files to construct input data for plotting"""
-        for mite in self.data.iterdir():
-            with open(mite) as infile:
-                mite_data = json.load(infile)
+    def run(self) -> pd.DataFrame:
+        """Iterates over MITE files to construct input data for plotting
 
-            if mite_data["status"] != "active":
-                logger.info(f"{mite_data['accession']} is retired - SKIP")
-                continue
+        Returns:
+            The plotting DataFrame, also written to mite_data.csv
+        """
+        with os.scandir(self.data) as entries:
+            paths = [
+                entry.path
+                for entry in entries
+                if entry.is_file() and entry.name.endswith(".json")
+            ]
 
-            self.extract_mite(mite_data)
+        with ProcessPoolExecutor() as executor:
+            rows = [
+                row
+                for row in executor.map(self.parse_mite, paths, chunksize=32)
+                if row
+            ]
 
         self.output.mkdir(exist_ok=True)
 
-        df1 = pd.DataFrame(self.mite_data)
-        df1.sort_values(by=["tailoring"], ascending=True, inplace=True)
+        df1 = pd.DataFrame(
+            rows,
+            columns=[
+                "mite_acc",
+                "reaction",
+                "enzyme_name",
+                "enzyme_description",
+                "tailoring",
+                "id_uniprot",
+                "id_genpept",
+            ],
+        )
+        df1.sort_values(
+            by=["tailoring"], ascending=True, inplace=True, ignore_index=True
+        )
         df1.to_csv(Path(self.output).joinpath("mite_data.csv"), index=False)
+        return df1
 
-    def extract_mite(self, data: dict) -> None:
-        """Extract data for tmap plotting
+    @staticmethod
+    def parse_mite(path: str) -> tuple | None:
+        """Extract data for tmap plotting from a single mite file
 
         Onle one representative reaction per MITE entry is plotted
 
         Arguments:
-            data: a dict from mite json file
+            path: path to a mite json file
+
+        Returns:
+            A tuple with the row data or None if the entry is retired
         """
-        categ = "|".join(
-            sorted(
-                {
-                    tailoring
-                    for reaction in data.get("reactions")
-                    for tailoring in reaction.get("tailoring", [])
-                }
-            )
-        )
-        if re.search(r"\|", categ):
+        with open(path, "rb") as infile:
+            data = orjson.loads(infile.read())
+
+        if data["status"] != "active":
+            logger.info(f"{data['accession']} is retired - SKIP")
+            return None
+
+        tailorings = {
+            tailoring
+            for reaction in data.get("reactions", [])
+            for tailoring in reaction.get("tailoring", [])
+        }
+        if len(tailorings) > 1:
             categ = "Multiple"
-
-        self.mite_data["reaction"].append(
-            f"{data['reactions'][0]['reactions'][0]['substrate']}>>{'.'.join(data['reactions'][0]['reactions'][0]['products'])}"
-        )
-        self.mite_data["mite_acc"].append(data["accession"])
-        self.mite_data["enzyme_name"].append(
-            data["enzyme"].get("name", "").replace(",", "")
-        )
-        self.mite_data["enzyme_description"].append(
-            data["enzyme"].get("description", "").replace(",", "")
+        else:
+            categ = next(iter(tailorings), "")
+
+        rxn0 = data["reactions"][0]["reactions"][0]
+        enzyme = data["enzyme"]
+        dbids = enzyme["databaseIds"]
+
+        return (
+            data["accession"],
+            f"{rxn0['substrate']}>>{'.'.join(rxn0['products'])}",
+            enzyme.get("name", "").replace(",", ""),
+            enzyme.get("description", "").replace(",", ""),
+            categ,
+            dbids.get("uniprot", ""),
+            dbids.get("genpept", ""),
         )
-        self.mite_data["id_uniprot"].append(
-            data["enzyme"]["databaseIds"].get("uniprot", "")
-        )
-        self.mite_data["id_genpept"].append(
-            data["enzyme"]["databaseIds"].get("genpept", "")
-        )
-        self.mite_data["tailoring"].append(categ)
 
 
+@dataclass(slots=True, kw_only=True)
 class PlotManager(AbstractManager):
     """Organizes code to run the tmap plotting"""
 
-    def run(self) -> None:
-        """Runs the code"""
+    def run(self, df: pd.DataFrame | None = None) -> None:
+        """Runs the code
+
+        Args:
+            df: the plotting DataFrame; read from mite_data.csv if not provided
+        """
+        if df is None:
+            df = pd.read_csv(self.output.joinpath("mite_data.csv"))
+
+        self.generate_fps(df)
+        self.plot_fps_sns(df)
+
+    def generate_fps(self, df: pd.DataFrame) -> None:
+        """Generates drfp fingerprints for new reactions and dumps them as pickle file
+
+        The pickle file holds a dict of reaction smiles to fingerprint, so only
+        reactions not encountered in a previous run are encoded.
 
-        if not self.output.joinpath("rxn_smiles.pickle").exists():
-            self.generate_fps()
+        Args:
+            df: the plotting DataFrame
+        """
+        from drfp import DrfpEncoder
 
-        self.plot_fps_sns()
+        cache = self.load_fps()
 
-    def generate_fps(self) -> None:
-        """Generates drfp fingerprints and dumps them as pickle file"""
-        df = pd.read_csv(self.output.joinpath("mite_data.csv"))
-        rxn_smiles = df["reaction"].tolist()
+        missing = list(dict.fromkeys(s for s in df["reaction"] if s not in cache))
+        if not missing:
+            return
 
-        enc = DrfpEncoder.encode(rxn_smiles)
+        n_chunks = min(os.cpu_count() or 1, len(missing))
+        chunks = [missing[i::n_chunks] for i in range(n_chunks)]
+        with ProcessPoolExecutor(max_workers=n_chunks) as executor:
+            for chunk, enc in zip(chunks, executor.map(DrfpEncoder.encode, chunks)):
+                cache.update(zip(chunk, enc))
 
         with open(self.output.joinpath("rxn_smiles.pickle"), "wb") as outfile:
-            pickle.dump(obj=enc, file=outfile)
+            pickle.dump(obj=cache, file=outfile, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def load_fps(self) -> dict:
+        """Loads the fingerprint cache, ignoring files in the old list format
+
+        Returns:
+            A dict of reaction smiles to drfp fingerprint
+        """
+        path = self.output.joinpath("rxn_smiles.pickle")
+        if not path.exists():
+            return {}
+
+        with open(path, "rb") as infile:
+            cache = pickle.load(infile)
 
-    def plot_fps_sns(self) -> None:
-        """Reads fingerprints from pickle file and plots them using tmap and seaborn"""
-        df = pd.read_csv(self.output.joinpath("mite_data.csv"))
+        return cache if isinstance(cache, dict) else {}
 
-        with open(self.output.joinpath("rxn_smiles.pickle"), "rb") as infile:
-            mite_drfp = pickle.load(infile)
+    def plot_fps_sns(self, df: pd.DataFrame) -> None:
+        """Reads fingerprints from pickle file and plots them using tmap and matplotlib
+
+        Args:
+            df: the plotting DataFrame
+        """
+        import hnswlib
+        from matplotlib.collections import LineCollection
+        import matplotlib.pyplot as plt
+        import tmap as tm
+
+        cache = self.load_fps()
+        mite_drfp = [cache[s] for s in df["reaction"]]
+
+        plt.rcParams.update(
+            {
+                "path.simplify": True,
+                "path.simplify_threshold": 1.0,
+                "svg.fonttype": "none",
+            }
+        )
 
         fig, ax = plt.subplots(1, 1, sharex=False, sharey=False)
         fig.set_figheight(5)
@@ -276,126 +393,98 @@ class PlotManager(AbstractManager):
         CFG_TMAP.mmm_repeats = 4
 
         y_values = df["tailoring"].tolist()
-        knn = []
 
-        annoy = AnnoyIndex(2048, metric="angular")
-        for i, v in enumerate(mite_drfp):
-            annoy.add_item(i, v)
+        bits = np.asarray(mite_drfp, dtype=np.uint8)
+        fps = np.packbits(bits, axis=1)
+
+        vectors = bits.astype(np.float32)
+        index = hnswlib.Index(space="cosine", dim=2048)
+        index.init_index(max_elements=len(bits), ef_construction=200, M=16)
+        index.add_items(vectors)
+        index.set_ef(50)
+        ids, _ = index.knn_query(vectors, k=min(10, len(bits)))
 
-        annoy.build(10)
-        for i in range(len(mite_drfp)):
-            for j in annoy.get_nns_by_item(i, 10):
-                knn.append((i, j, cosine_distance(mite_drfp[i], mite_drfp[j])))
+        n_edges = ids.size
+        src = np.empty(n_edges, dtype=np.int64)
+        dst = np.empty(n_edges, dtype=np.int64)
+        dist = np.empty(n_edges, dtype=np.float64)
+        tanimoto_edges_kernel()(fps, ids.astype(np.int64), src, dst, dist)
+
+        keep = src != dst
+        src, dst, dist = src[keep], dst[keep], dist[keep]
+        knn = list(zip(src.tolist(), dst.tolist(), dist.tolist()))
 
         x, y, s, t, _ = tm.layout_from_edge_list(len(mite_drfp), knn, config=CFG_TMAP)
-        for i in range(len(s)):
-            ax.plot(
-                [x[s[i]], x[t[i]]],
-                [y[s[i]], y[t[i]]],
-                "k-",
-                linewidth=0.5,
-                alpha=0.5,
-                zorder=1,
-            )
+        x, y, s, t = (np.asarray(v) for v in (x, y, s, t))
+        segments = np.stack(
+            [np.column_stack([x[s], y[s]]), np.column_stack([x[t], y[t]])], axis=1
+        )
+        ax.add_collection(
+            LineCollection(segments, colors="k", linewidths=0.5, alpha=0.5, zorder=1)
+        )
 
         df_tmap = pd.DataFrame({"x": x, "y": y, "c": y_values})
 
         # full palette
-        # sns.set_palette(
-        #     [
-        #         "#9ad59a",  # acetylation
-        #         "#91efd4",  # amination
-        #         "#c2c3d0",  # biaryl
-        #         "#ccc0dd",  # cycliz
-        #         "#decd87",  # deamination
-        #         "#dcb89d",  # decarboxylation
-        #         "#ff9b9b",  # dehydr
-        #         "#ffaf79",  # dehydrogen
-        #         "#ffffaf",  # dioxygenation
-        #         "#78804d",  # epimerisation
-        #         "#c0d1b6",  # glycosly
-        #         "#93b0b0",  # halogenation
-        #         "#8caad1",  # heterocycl
-        #         "#9d6ab1",  # hydrolysis
-        #         "#b958aa",  # hydoxylation
-        #         "#ab4962",  # macrolactam
-        #         "#dd626a",  # methylation
-        #         "#d57058",  # monooxygenation
-        #         "#5599ff",  # multiple
-        #         "#afafaf",  # other
-        #         "#b38466",  # oxidation
-        #         "#5dc851",  # prenylation
-        #         "#958479",  # reduction
-        #         "#f78c6a",  # sulfonation
-        #     ]
-        # )
+        # highlight = {
+        #     "Acetylation": "#9ad59a",
+        #     "Amination": "#91efd4",
+        #     "Biaryl bond formation": "#c2c3d0",
+        #     "Cyclization": "#ccc0dd",
+        #     "Deamination": "#decd87",
+        #     "Decarboxylation": "#dcb89d",
+        #     "Dehydration": "#ff9b9b",
+        #     "Dehydrogenation": "#ffaf79",
+        #     "Dioxygenation": "#ffffaf",
+        #     "Epimerization": "#78804d",
+        #     "Glycosylation": "#c0d1b6",
+        #     "Halogenation": "#93b0b0",
+        #     "Heterocyclization": "#8caad1",
+        #     "Hydrolysis": "#9d6ab1",
+        #     "Hydroxylation": "#b958aa",
+        #     "Macrolactam formation": "#ab4962",
+        #     "Methylation": "#dd626a",
+        #     "Monooxygenation": "#d57058",
+        #     "Multiple": "#5599ff",
+        #     "Other": "#afafaf",
+        #     "Oxidation": "#b38466",
+        #     "Prenylation": "#5dc851",
+        #     "Reduction": "#958479",
+        #     "Sulfonation": "#f78c6a",
+        # }
         # simplified palette
-        sns.set_palette(
-            [
-                "#afafaf",  # acetylation
-                "#afafaf",  # amination
-                "#afafaf",  # biaryl
-                "#afafaf",  # cycliz
-                "#afafaf",  # deamination
-                "#afafaf",  # decarboxylation
-                "#afafaf",  # dehydr
-                "#afafaf",  # dehydrogen
-                "#afafaf",  # dioxygenation
-                "#afafaf",  # epimerisation
-                "#afafaf",  # glycosly
-                "#5599ff",  # halogenation
-                "#afafaf",  # heterocycl
-                "#afafaf",  # hydrolysis
-                "#b958aa",  # hydoxylation
-                "#afafaf",  # macrolactam
-                "#dd626a",  # methylation
-                "#afafaf",  # monooxygenation
-                "#afafaf",  # multiple
-                "#afafaf",  # other
-                "#b38466",  # oxidation
-                "#afafaf",  # prenylation
-                "#afafaf",  # reduction
-                "#afafaf",  # sulfonation
-            ]
-        )
-
-        sns.scatterplot(
-            x="x",
-            y="y",
-            hue="c",
-            data=df_tmap,
-            palette=sns.color_palette(),
-            s=75.0,
-            ax=ax,
-            zorder=2,
-        )
-
-        legend = ax.legend(
-            loc="center left",
-            bbox_to_anchor=(1, 0.5),
-            fancybox=False,
-            shadow=False,
-            frameon=False,
-            ncol=1,
-            fontsize=8,
-        )
+        highlight = {
+            "Halogenation": "#5599ff",
+            "Hydroxylation": "#b958aa",
+            "Methylation": "#dd626a",
+            "Oxidation": "#b38466",
+        }
+
+        xs = df_tmap["x"].to_numpy()
+        ys = df_tmap["y"].to_numpy()
+        colors = df_tmap["c"].map(highlight).fillna("#afafaf").to_numpy()
+        ax.scatter(xs, ys, c=colors, s=75.0, edgecolors="w", zorder=2)
 
         ax.axis("off")
-        ax.get_legend().remove()
         plt.tight_layout()
 
-        plt.savefig(self.output.joinpath("tmap_mite_plain.svg"), format="svg")
+        plt.savefig(
+            self.output.joinpath("tmap_mite_plain.svg"),
+            format="svg",
+            bbox_inches=None,
+            pad_inches=0,
+        )
 
-        for i in range(len(df_tmap)):
-            plt.text(
-                x=df_tmap["x"][i],
-                y=df_tmap["y"][i],
-                s=str(df["enzyme_name"][i]),
-                fontsize=6,
-                ha="center",
-            )
+        labels = df["enzyme_name"].astype(str).to_numpy()
+        for x0, y0, label in zip(xs, ys, labels):
+            ax.text(x0, y0, label, fontsize=6, ha="center")
 
-        plt.savefig(self.output.joinpath("tmap_mite_annotated.svg"), format="svg")
+        plt.savefig(
+            self.output.joinpath("tmap_mite_annotated.svgz"),
+            format="svgz",
+            bbox_inches=None,
+            pad_inches=0,
+        )
 
 
 def main() -> None:
@@ -417,10 +506,10 @@ def main() -> None:
     download_manager.run()
 
     data_manager = DataManager()
-    data_manager.run()
+    df = data_manager.run()
 
     plot_manager = PlotManager()
-    plot_manager.run()
+    plot_manager.run(df=df)
 
 
 if __name__ == "__main__":